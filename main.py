@@ -32,11 +32,12 @@ from app import (
     get_game_state, save_game_state, GameState, 
     simulate_bots, load_current_drug_prices,
     rooms_config, load_bots, modify_market_supply, add_chat_message,
-    get_who_list, get_top_list, weapon_prices_config, npcs_data,
+    get_who_list, get_top_list, weapon_prices_config, get_location_npcs,
     process_combat_action, generate_random_room, reset_game_state
 )
 
 Window.size = (400, 700)
+STREET_REPORTS = ("Avoided a drive-by.", "Found a stash of brass knuckles.", "Bots are trading heavy today.", "The block is hot.")
 
 class GameScreen(Screen):
     def __init__(self, **kwargs):
@@ -50,6 +51,9 @@ class GameScreen(Screen):
         if hasattr(self, 'build_ui'):
             self.build_ui()
 
+    def take_step(self):
+        if self.game_state.take_step(): game_logic.update_daily_prices()
+
     def create_header(self):
         header = BoxLayout(size_hint_y=0.18, padding=dp(5), spacing=dp(5))
         info = BoxLayout(orientation='vertical', size_hint_x=0.45)
@@ -218,12 +222,12 @@ class CrackhouseScreen(GameScreen):
         curr_qty = getattr(self.game_state.drugs, drug, 0)
         if action == 'buy' and self.game_state.money >= price:
             self.game_state.money -= price
-            setattr(self.game_state.drugs, drug, curr_qty + 1)
+            self.game_state.drugs.add(drug, 1)
             modify_market_supply(drug, -1)
             simulate_bots(self.game_state.current_location, self.game_state.player_name)
         elif action == 'sell' and curr_qty > 0:
             self.game_state.money += price
-            setattr(self.game_state.drugs, drug, curr_qty - 1)
+            self.game_state.drugs.add(drug, -1)
             modify_market_supply(drug, 1)
             simulate_bots(self.game_state.current_location, self.game_state.player_name)
         save_game_state(self.game_state); self.update_game_state()
@@ -302,14 +306,13 @@ class AlleywayScreen(GameScreen):
         if nxt == 'city': self.manager.current = 'city'
         else:
             App.get_running_app().rid = nxt
-            self.game_state.steps += 1
             simulate_bots(self.game_state.current_location, self.game_state.player_name)
-            if self.game_state.steps >= self.game_state.max_steps: self.end_day()
+            self.take_step()
             save_game_state(self.game_state); self.update_game_state()
 
     def do_search(self, instance):
-        self.game_state.steps += 1; simulate_bots(self.game_state.current_location, self.game_state.player_name); rid = App.get_running_app().rid
-        boss = next((n for n in npcs_data.values() if n['location'] == rid and n['is_alive']), None)
+        simulate_bots(self.game_state.current_location, self.game_state.player_name); rid = App.get_running_app().rid
+        boss = next((n for n in get_location_npcs(rid) if n['is_alive']), None)
         if boss:
             self.manager.get_screen('combat').setup_fight(boss['name'], 1, boss['hp'], True)
             self.manager.current = 'combat'
@@ -323,16 +326,12 @@ class AlleywayScreen(GameScreen):
                 self.show_message("Loot", f"Found a briefcase with ${amt:,}!")
             elif roll < 0.45:
                 drug = random.choice(self.game_state.drugs.keys())
-                setattr(self.game_state.drugs, drug, getattr(self.game_state.drugs, drug) + 5)
+                self.game_state.drugs.add(drug, 5)
                 self.show_message("Loot", f"Found 5kg of {drug}!")
             else: self.show_message("Empty", "Nothing but rats and rust.")
-        if self.game_state.steps >= self.game_state.max_steps: self.end_day()
+        self.take_step()
         save_game_state(self.game_state); self.update_game_state()
 
-    def end_day(self):
-        self.game_state.day += 1; self.game_state.steps = 0
-        game_logic.update_daily_prices()
-
 class CombatScreen(GameScreen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -403,8 +402,7 @@ class WanderScreen(GameScreen):
 
         self.layout.clear_widgets()
         self.layout.add_widget(self.create_header())
-        events = ["Avoided a drive-by.", "Found a stash of brass knuckles.", "Bots are trading heavy today.", "The block is hot."]
-        self.layout.add_widget(Label(text=f"[b]STREET REPORT[/b]\n\n{random.choice(events)}", markup=True, halign='center'))
+        self.layout.add_widget(Label(text=f"[b]STREET REPORT[/b]\n\n{random.choice(STREET_REPORTS)}", markup=True, halign='center'))
         btn = Button(text="CONTINUE", size_hint_y=0.2, on_press=lambda x: setattr(self.manager, 'current', 'city'))
         self.layout.add_widget(btn)
 
@@ -2,16 +2,87 @@
 import os
 import time
 import random
+import heapq
+import itertools
 import json
+import sqlite3
+import tempfile
+import threading
 import argparse
-from dataclasses import dataclass, field, asdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, fields
+from types import MappingProxyType
 from typing import Dict, List, Optional
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from jinja2 import FileSystemBytecodeCache, TemplateError
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, g, has_request_context
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # stdlib json fallback
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows: requests in one process still serialize on a thread lock
 
 app = Flask(__name__)
 app.secret_key = 'pimp_syndicate_secret_777_stable'
+# Behind nginx/Apache, USE_X_SENDFILE=1 lets the front server stream /static files itself
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE', '0') == '1'
 socketio = None # Standard SocketIO placeholder for WSGI entries
 
+# Optional server-side sessions: SESSION_TYPE=redis (or filesystem) keeps only
+# a session id in the cookie. Needs `pip install Flask-Session redis`.
+if os.environ.get('SESSION_TYPE'):
+    try:
+        from flask_session import Session
+        app.config['SESSION_TYPE'] = os.environ.get('SESSION_TYPE')
+        app.config['SESSION_USE_SIGNER'] = True
+        if app.config['SESSION_TYPE'] == 'redis':
+            import redis
+            app.config['SESSION_REDIS'] = redis.from_url(os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+        Session(app)
+    except ImportError as e:
+        print(f"Server-side sessions unavailable ({e}), using cookie sessions")
+
+# Optional fragment caching for {% cache %} blocks in templates. Needs
+# `pip install Flask-Caching`; without it the blocks simply render uncached.
+try:
+    from flask_caching import Cache
+    cache = Cache(app, config={'CACHE_TYPE': os.environ.get('CACHE_TYPE', 'SimpleCache')})
+except ImportError:
+    from jinja2 import nodes
+    from jinja2.ext import Extension
+
+    class UncachedFragmentExtension(Extension):
+        tags = {'cache'}
+
+        def parse(self, parser):
+            lineno = next(parser.stream).lineno
+            while parser.stream.current.type != 'block_end':
+                next(parser.stream)  # timeout and key arguments are unused
+            body = parser.parse_statements(('name:endcache',), drop_needle=True)
+            return nodes.Scope(body).set_lineno(lineno)
+
+    cache = None
+    app.jinja_env.add_extension(UncachedFragmentExtension)
+
+# JINJA_CACHE_DIR keeps compiled templates on disk so restarted workers skip
+# reparsing them, and compiles every template at startup so no page pays for
+# it on its first request. Jinja keys bytecode on template source only, and
+# {% cache %} compiles differently with and without Flask-Caching, so each
+# mode gets its own cache files.
+JINJA_CACHE_DIR = os.environ.get('JINJA_CACHE_DIR')
+if JINJA_CACHE_DIR:
+    os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+    _fragment_mode = 'cached' if cache is not None else 'uncached'
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(JINJA_CACHE_DIR, pattern=f'__jinja2_{_fragment_mode}_%s.cache')
+    for _template in app.jinja_env.list_templates():
+        try:
+            app.jinja_env.get_template(_template)
+        except TemplateError:
+            pass  # a broken template still fails on its own page, not at startup
+
 # Suppress successful GET request logs (only show errors and warnings)
 import logging
 from werkzeug.serving import WSGIRequestHandler
@@ -40,27 +111,98 @@ def get_model_path(filename):
     """Returns the absolute path to a model file."""
     return os.path.join(MODEL_DIR, filename)
 
+# Saves write a private temp file and rename it over the target, so readers
+# (and other worker processes) only ever see a complete file. Setting
+# JSON_WRITE_BEHIND=1 hands the disk write to a single background thread
+# instead; until it lands, load_json serves the pending bytes and repeated
+# saves of a file collapse into one write. Those pending bytes are only
+# visible to this process, so only enable it for single-process servers
+# that allow threads (not multi-worker uWSGI).
+_pending_writes = {}
+_pending_lock = threading.Lock()
+_persist_pool = (ThreadPoolExecutor(max_workers=1, thread_name_prefix='gangwar-save')
+                 if os.environ.get('JSON_WRITE_BEHIND') == '1' else None)
+
 def load_json(filename, default=None):
     path = get_model_path(filename)
     try:
-        if os.path.exists(path):
-            with open(path, 'r', encoding='utf-8') as f:
+        with _pending_lock:
+            content = _pending_writes.get(path)
+        if content is None:
+            with open(path, 'rb') as f:
                 content = f.read().strip()
-                if content:
-                    return json.loads(content)
+        if content:
+            return orjson.loads(content) if orjson else json.loads(content)
+        return default if default is not None else {}
+    except FileNotFoundError:
         return default if default is not None else {}
     except Exception as e:
         print(f"Error loading {filename} from {path}: {e}")
         return default if default is not None else {}
 
+def _write_file_atomic(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Each writer gets its own temp file; a shared name lets concurrent
+    # workers interleave their bytes before one of them renames it
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())  # the rename must not land before the data does
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def _flush_json(path):
+    with _pending_lock:
+        content = _pending_writes.get(path)
+    if content is None:
+        return  # already written by an earlier flush
+    try:
+        _write_file_atomic(path, content)
+    except Exception as e:
+        print(f"Error saving {path}: {e}")
+    with _pending_lock:
+        if _pending_writes.get(path) is content:
+            del _pending_writes[path]
+
 def save_json(filename, data):
+    # Everything saved here is runtime state rewritten on most requests, so
+    # write it compact rather than pretty-printed
     path = get_model_path(filename)
     try:
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2)
+        if orjson:
+            content = orjson.dumps(data)
+        else:
+            content = json.dumps(data, separators=(',', ':')).encode('utf-8')
     except Exception as e:
         print(f"Error saving {filename} to {path}: {e}")
+        return
+    if _persist_pool is None:
+        try:
+            _write_file_atomic(path, content)
+        except Exception as e:
+            print(f"Error saving {filename} to {path}: {e}")
+        return
+    with _pending_lock:
+        _pending_writes[path] = content
+    _persist_pool.submit(_flush_json, path)
+
+_config_cache = {}
+
+def load_config(filename, default=None):
+    """load_json() for config files, reparsed only when the file's mtime changes. Do not mutate the result."""
+    path = get_model_path(filename)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return load_json(filename, default)
+    cached = _config_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = _config_cache[path] = (mtime, load_json(filename, default))
+    return cached[1]
 
 # Shared Data Files
 BOTS_FILE = 'bots.json'
@@ -70,58 +212,200 @@ PLAYER_FILE = 'player_state.json'
 NPCS_FILE = 'npcs.json'
 ROOMS_FILE = 'rooms_config.json'
 HIGH_SCORES_FILE = 'high_scores.json'
+HIGH_SCORES_DB = 'high_scores.db'
 
 # ============
 # Dataclasses
 # ============
 
-@dataclass
+@dataclass(slots=True)
 class Drugs:
     weed: int = 0; crack: int = 5; coke: int = 0; ice: int = 0; percs: int = 0; pixie_dust: int = 0; lean: int = 0; shrooms: int = 0; acid: int = 0; opium: int = 0; crystal_blue: int = 0; white_widow: int = 0; purple_haze: int = 0; fentanyl: int = 0; ketamine: int = 0; speed: int = 0; blue_dream: int = 0; red_devil: int = 0; white_china: int = 0; mdma_crystals: int = 0; moon_rocks: int = 0; blue_magic: int = 0; grey_death: int = 0; super_lemon_haze: int = 0
     def keys(self): 
-        config = load_json('drug_config.json', {"drugs": {}})
+        config = load_config('drug_config.json', {"drugs": {}})
         return list(config.get('drugs', {}).keys())
+    def add(self, kind: str, amount: int) -> None: setattr(self, kind, getattr(self, kind) + amount)
 
-@dataclass
+DRUG_TYPES = frozenset(f.name for f in fields(Drugs))
+MAX_TRADE_QUANTITY = 10_000  # one form post can't move more than this
+
+@dataclass(slots=True)
 class Weapons:
     pistols: int = 0; bullets: int = 10; grenades: int = 0; vampire_bat: int = 0; missile_launcher: int = 0; missiles: int = 0; vest: int = 0; knife: int = 1; ghost_guns: int = 0; ar15: int = 0; exploding_bullets: int = 0; hollow_point_bullets: int = 0; sword: int = 0; axe: int = 0; golden_gun: int = 0; poison_blowgun: int = 0; chain_whip: int = 0; plasma_cutter: int = 0; flamethrower: int = 0; katana: int = 0; brass_knuckles: int = 0; uzi: int = 0; sawed_off_shotgun: int = 0; sniper_rifle: int = 0; molotov: int = 0; micro_smg: int = 0; grenade_launcher: int = 0; combat_knife: int = 0; pistol_automatic: bool = False; ghost_gun_automatic: bool = False
+    def can_fight_with_pistol(self) -> bool: return self.pistols > 0 and self.bullets > 0
+
+DEFAULT_FLAGS = MappingProxyType({"eric_met": False, "steve_met": False, "has_id": False})
 
-@dataclass
+@dataclass(slots=True)
 class GameState:
-    player_name: str = ""; gang_name: str = ""; money: int = 1000; account: int = 0; loan: int = 0; loan_days: int = 0; members: int = 1; squidies: int = 25; day: int = 1; health: int = 30; steps: int = 0; max_steps: int = 7; current_score: int = 0; current_location: str = "city"; lives: int = 3; damage: int = 0; drugs: Drugs = field(default_factory=Drugs); weapons: Weapons = field(default_factory=Weapons); drug_prices: Dict[str, int] = field(default_factory=dict); flags: Dict[str, bool] = field(default_factory=lambda: {"eric_met": False, "steve_met": False, "has_id": False}); squidies_pistols: int = 50; squidies_bullets: int = 500; squidies_grenades: int = 20; squidies_missile_launcher: int = 5; squidies_missiles: int = 50
+    player_name: str = ""; gang_name: str = ""; money: int = 1000; account: int = 0; loan: int = 0; loan_days: int = 0; members: int = 1; squidies: int = 25; day: int = 1; health: int = 30; steps: int = 0; max_steps: int = 7; current_score: int = 0; current_location: str = "city"; lives: int = 3; damage: int = 0; drugs: Drugs = field(default_factory=Drugs); weapons: Weapons = field(default_factory=Weapons); drug_prices: Dict[str, int] = field(default_factory=dict); flags: Dict[str, bool] = field(default_factory=DEFAULT_FLAGS.copy); squidies_pistols: int = 50; squidies_bullets: int = 500; squidies_grenades: int = 20; squidies_missile_launcher: int = 5; squidies_missiles: int = 50; version: int = 0
     @property
     def max_health(self) -> int: return 30 + 10 * (self.members - 1)
 
+    def take_step(self) -> bool:
+        """Takes one step, ending the day once max_steps is reached; returns True on a new day."""
+        self.steps += 1
+        if self.steps < self.max_steps:
+            return False
+        self.day += 1; self.steps = 0
+        return True
+
+    def to_dict(self) -> dict:
+        """Flattens the state for storage without asdict()'s recursive deep copy."""
+        data = {name: getattr(self, name) for name in _GAMESTATE_FIELDS}
+        data['drugs'] = {name: getattr(self.drugs, name) for name in _DRUGS_FIELDS}
+        data['weapons'] = {name: getattr(self.weapons, name) for name in _WEAPONS_FIELDS}
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "GameState":
+        """Rebuilds a state from stored data, ignoring keys that are no longer fields."""
+        data = _known_fields(cls, data)
+        data['drugs'] = Drugs(**_known_fields(Drugs, data.get('drugs')))
+        data['weapons'] = Weapons(**_known_fields(Weapons, data.get('weapons')))
+        return cls(**data)
+
+def _known_fields(cls, data):
+    if not isinstance(data, dict): return {}
+    return {k: v for k, v in data.items() if k in cls.__dataclass_fields__}
+
+_DRUGS_FIELDS = tuple(f.name for f in fields(Drugs))
+_WEAPONS_FIELDS = tuple(f.name for f in fields(Weapons))
+# drug_prices is rebuilt from the live market on every load, so it is never persisted
+_GAMESTATE_FIELDS = tuple(f.name for f in fields(GameState) if f.name != 'drug_prices')
+
 # ============
 # Logic Helpers
 # ============
 
+_request_state_lock = threading.Lock()
+
+def _lock_state_file():
+    """Opens the player state's lock file and holds it exclusively until it is closed."""
+    if fcntl is None:
+        return None
+    lock_file = open(get_model_path(PLAYER_FILE) + '.lock', 'a')
+    fcntl.flock(lock_file, fcntl.LOCK_EX)
+    return lock_file
+
+def claim_game_state():
+    """Serializes requests that touch the player state, across threads and
+    worker processes, until the request ends. Claiming before the state is
+    loaded means no other request can save in between, so a view's side
+    effects never run against a copy that is about to be refused."""
+    if g.get('game_state_claimed'):
+        return
+    _request_state_lock.acquire()
+    g.game_state_claimed = True
+    g.game_state_lock_file = _lock_state_file()
+
+@app.teardown_request
+def release_game_state(exc):
+    lock_file = g.pop('game_state_lock_file', None)
+    if lock_file is not None:
+        lock_file.close()  # closing drops the flock
+    if g.pop('game_state_claimed', False):
+        _request_state_lock.release()
+
 def get_game_state():
+    """Returns the current GameState, loading it at most once per request."""
+    if not has_request_context():
+        return load_game_state()
+    if 'game_state' not in g:
+        claim_game_state()
+        g.game_state = load_game_state()
+    return g.game_state
+
+def load_game_state():
     """Reconstructs the GameState from persistent storage."""
-    def filter_keys(cls, data):
-        if not isinstance(data, dict): return {}
-        return {k: v for k, v in data.items() if k in cls.__dataclass_fields__}
-
     raw_data = load_json(PLAYER_FILE)
-    if not raw_data:
-        raw_data = asdict(GameState())
+    gs = GameState.from_dict(raw_data) if raw_data else GameState()
+    gs.drug_prices = get_current_prices().get('prices', {})
+    return gs
 
-    # Nested Object Rebuild
-    raw_data['drugs'] = Drugs(**filter_keys(Drugs, raw_data.get('drugs', {})))
-    raw_data['weapons'] = Weapons(**filter_keys(Weapons, raw_data.get('weapons', {})))
-    raw_data['drug_prices'] = get_current_prices().get('prices', {})
-    
-    return GameState(**filter_keys(GameState, raw_data))
+KNOCKOUT_DAMAGE = 30
+
+def apply_knockout(gs):
+    """Trades accumulated damage for a life once it reaches KNOCKOUT_DAMAGE; returns True if knocked out."""
+    if gs.damage < KNOCKOUT_DAMAGE:
+        return False
+    gs.lives -= 1; gs.damage = 0; gs.health = 30
+    return True
+
+_endpoint_urls = {}
+
+def endpoint_url(endpoint):
+    """url_for() for endpoints without arguments, built once per script root."""
+    key = (endpoint, request.script_root)
+    url = _endpoint_urls.get(key)
+    if url is None:
+        url = _endpoint_urls[key] = url_for(endpoint)
+    return url
+
+def calculate_score(money, day, members):
+    """Street score: one point per $1000, 100 per day survived, 50 per crew member."""
+    return (money // 1000) + (day * 100) + (members * 50)
+
+class StaleGameStateError(Exception):
+    """Raised when the saved state changed after this copy of it was loaded."""
+
+_game_state_lock = threading.Lock()
+
+def save_game_state(gs, force=False):
+    """Saves the current state to disk.
+
+    Requests hold the state claimed from load to save, so the version check
+    only trips where the cross-process lock is unavailable (no fcntl). The
+    desktop client is the only writer in its process, so it always saves,
+    but it waits for any request holding the state.
+    """
+    gs.current_score = calculate_score(gs.money + gs.account, gs.day, gs.members)
+    lock_file = None
+    if has_request_context():
+        claim_game_state()
+    else:
+        lock_file = _lock_state_file()
+    try:
+        with _game_state_lock:
+            saved_version = load_json(PLAYER_FILE).get('version', 0)
+            if not force and has_request_context() and saved_version != gs.version:
+                raise StaleGameStateError(f"state is at version {saved_version}, not {gs.version}")
+            gs.version = saved_version + 1
+            save_json(PLAYER_FILE, gs.to_dict())
+    finally:
+        if lock_file is not None:
+            lock_file.close()
+    if has_request_context():
+        g.game_state = gs
+
+def mark_dirty(gs):
+    """Flags the state as changed; inside a request it is saved once after the view returns."""
+    if not has_request_context():
+        return save_game_state(gs)
+    gs.current_score = calculate_score(gs.money + gs.account, gs.day, gs.members)
+    g.game_state = gs
+    g.game_state_dirty = True
+
+def set_location(location):
+    """Moves the player, only marking the state dirty when the location actually changes."""
+    gs = get_game_state()
+    if gs.current_location != location:
+        gs.current_location = location
+        mark_dirty(gs)
+    return gs
 
-def save_game_state(gs):
-    """Saves the current state to disk."""
-    total = gs.money + gs.account
-    gs.current_score = (total // 1000) + (gs.day * 100) + (gs.members * 50)
-    save_json(PLAYER_FILE, asdict(gs))
+@app.after_request
+def flush_game_state(response):
+    if g.pop('game_state_dirty', False):
+        try:
+            save_game_state(g.game_state)
+        except StaleGameStateError:
+            flash("Your game changed in another window before this move finished, so your stats were not updated.")
+    return response
 
 def reset_game_state():
     gs = GameState()
-    save_game_state(gs)
+    save_game_state(gs, force=True)
     return gs
 
 # Context processor for templates
@@ -132,25 +416,25 @@ def inject_globals():
     except:
         gs = GameState()
     try:
-        hs = get_high_scores()
+        hs, hs_rev = get_high_scores_with_revision()
     except:
-        hs = []
+        hs, hs_rev = [], None
     try:
-        drug_config_data = load_json('drug_config.json', {"drugs": {}})
+        drug_config_data = load_config('drug_config.json', {"drugs": {}})
     except:
         drug_config_data = {"drugs": {}}
     try:
         top_list = get_top_list()
     except:
         top_list = []
-    return dict(game_state=gs, high_scores=hs, drug_config=drug_config_data, top_list=top_list)
+    return dict(game_state=gs, high_scores=hs, high_scores_rev=hs_rev, drug_config=drug_config_data, top_list=top_list)
 
 # ============
 # Market System
 # ============
 
 def get_market_supply():
-    drug_config_data = load_json('drug_config.json', {"drugs": {}})
+    drug_config_data = load_config('drug_config.json', {"drugs": {}})
     return load_json(MARKET_FILE, {d: 100 for d in drug_config_data.get('drugs', {})})
 
 def modify_market_supply(drug, amount):
@@ -159,7 +443,7 @@ def modify_market_supply(drug, amount):
     save_json(MARKET_FILE, market)
 
 def update_daily_market_events():
-    drug_config_data = load_json('drug_config.json', {"drugs": {}})
+    drug_config_data = load_config('drug_config.json', {"drugs": {}})
     event_multipliers = {}
     alerts = []
     for drug in drug_config_data.get('drugs', {}):
@@ -184,7 +468,7 @@ def update_daily_market_events():
     return res
 
 def get_current_prices():
-    drug_config_data = load_json('drug_config.json', {"drugs": {}})
+    drug_config_data = load_config('drug_config.json', {"drugs": {}})
     prices_state = load_json(PRICES_FILE, {})
     if prices_state.get('day') != time.strftime("%Y-%m-%d"):
         prices_state = update_daily_market_events()
@@ -215,18 +499,66 @@ def update_daily_prices(): return update_daily_market_events()
 # High Scores
 # ============
 
+HIGH_SCORES_LIMIT = 100
+HIGH_SCORE_COLUMNS = ("player_name", "gang_name", "score", "money_earned", "days_survived", "gang_wars_won", "fights_won", "date_achieved")
+
+# Seconds a fetched leaderboard is served from memory. add_high_score() clears
+# the cache, so this only bounds how stale scores saved by other workers get.
+HIGH_SCORES_TTL = 30
+
+_high_scores_db = None
+_high_scores_lock = threading.Lock()
+_high_scores_cache = {"t": 0.0, "v": None, "rev": None}
+
+def get_high_scores_db():
+    """Opens the shared high score database, importing the legacy JSON board on first use."""
+    global _high_scores_db
+    if _high_scores_db is None:
+        db = sqlite3.connect(get_model_path(HIGH_SCORES_DB), check_same_thread=False)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")  # WAL only needs to fsync at checkpoints
+        db.execute("""CREATE TABLE IF NOT EXISTS scores (
+            player_name TEXT, gang_name TEXT, score INTEGER, money_earned INTEGER,
+            days_survived INTEGER, gang_wars_won INTEGER, fights_won INTEGER, date_achieved TEXT)""")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_score ON scores(score DESC)")
+        if db.execute("SELECT COUNT(*) FROM scores").fetchone()[0] == 0:
+            legacy = load_json(HIGH_SCORES_FILE, [])
+            if isinstance(legacy, list):
+                db.executemany(
+                    f"INSERT INTO scores VALUES ({', '.join('?' * len(HIGH_SCORE_COLUMNS))})",
+                    [tuple(e.get(c) for c in HIGH_SCORE_COLUMNS) for e in legacy if isinstance(e, dict)]
+                )
+        db.commit()
+        _high_scores_db = db
+    return _high_scores_db
+
+def get_high_scores_with_revision():
+    """Returns the leaderboard and its revision, read together so they always match.
+
+    The revision is the newest surviving rowid. Scores are only ever added,
+    and the trim drops only rows below the cut, so it changes exactly when
+    the board does, and every worker process reads the same value.
+    """
+    with _high_scores_lock:
+        if _high_scores_cache["v"] is None or time.monotonic() - _high_scores_cache["t"] >= HIGH_SCORES_TTL:
+            db = get_high_scores_db()
+            rows = db.execute(
+                f"SELECT {', '.join(HIGH_SCORE_COLUMNS)} FROM scores ORDER BY score DESC LIMIT ?", (HIGH_SCORES_LIMIT,)
+            ).fetchall()
+            _high_scores_cache["v"] = [dict(r) for r in rows]
+            _high_scores_cache["rev"] = db.execute("SELECT MAX(rowid) FROM scores").fetchone()[0]
+            _high_scores_cache["t"] = time.monotonic()
+        return _high_scores_cache["v"], _high_scores_cache["rev"]
+
 def get_high_scores():
-    scores = load_json(HIGH_SCORES_FILE, [])
-    if isinstance(scores, list):
-        return scores
-    return []
+    return get_high_scores_with_revision()[0]
 
 def add_high_score(gs):
     """Add high score and ensure player name is saved correctly"""
     if not gs.player_name or gs.player_name.strip() == "":
         return  # Don't save scores without player names
     
-    scores = get_high_scores()
     new_score = {
         "player_name": gs.player_name.strip(),
         "gang_name": gs.gang_name.strip() if gs.gang_name else "No Gang",
@@ -237,9 +569,18 @@ def add_high_score(gs):
         "fights_won": 0,
         "date_achieved": time.strftime("%Y-%m-%d")
     }
-    scores.append(new_score)
-    scores.sort(key=lambda x: x.get('score', 0), reverse=True)
-    save_json(HIGH_SCORES_FILE, scores[:100])
+    with _high_scores_lock:
+        db = get_high_scores_db()
+        db.execute(
+            f"INSERT INTO scores ({', '.join(HIGH_SCORE_COLUMNS)}) VALUES ({', '.join('?' * len(HIGH_SCORE_COLUMNS))})",
+            tuple(new_score[c] for c in HIGH_SCORE_COLUMNS)
+        )
+        # Only the leaderboard is kept; drop everything below the cut
+        db.execute(
+            "DELETE FROM scores WHERE rowid NOT IN (SELECT rowid FROM scores ORDER BY score DESC LIMIT ?)", (HIGH_SCORES_LIMIT,)
+        )
+        db.commit()
+        _high_scores_cache["v"] = None
 
 # ============
 # Chat & Bot AI
@@ -248,15 +589,28 @@ def add_high_score(gs):
 CHAT_MESSAGES = []
 BOT_CHALLENGE = None
 
+_chat_lock = threading.Lock()  # request threads append while others read
+
+_chat_ids = itertools.count(1)  # ids keep rising after old messages are trimmed
+
 def add_chat_message(player, msg):
-    m = {"player": player, "message": msg, "time": time.strftime("%H:%M"), "id": len(CHAT_MESSAGES) + 1}
-    CHAT_MESSAGES.append(m)
-    if len(CHAT_MESSAGES) > 100: CHAT_MESSAGES.pop(0)
+    stamp = time.strftime("%H:%M")  # formatted before taking the lock
+    with _chat_lock:
+        m = {"player": player, "message": msg, "time": stamp, "id": next(_chat_ids)}
+        CHAT_MESSAGES.append(m)
+        if len(CHAT_MESSAGES) > 100: CHAT_MESSAGES.pop(0)
     return m
 
+def get_chat_messages(after_id=0):
+    """Returns a snapshot of the chat messages newer than after_id that is safe to iterate."""
+    with _chat_lock:
+        if CHAT_MESSAGES and after_id > CHAT_MESSAGES[-1]['id']:
+            after_id = 0  # the client saw ids from before a restart
+        return [m for m in CHAT_MESSAGES if m['id'] > after_id]
+
 def drop_drugs_on_death(bot, player_loc=None):
     """Drop drugs when a bot dies/gets knocked out"""
-    drug_config_data = load_json('drug_config.json', {"drugs": {}})
+    drug_config_data = load_config('drug_config.json', {"drugs": {}})
     drug_list = list(drug_config_data.get('drugs', {}).keys())
     
     # Drop all drugs the bot was carrying
@@ -275,39 +629,35 @@ def drop_drugs_on_death(bot, player_loc=None):
     
     return dropped_drugs
 
+# Rooms bots may roam (wandering streets and dark alleyway areas)
+BOT_ROOMS = (
+    "entrance", "dead_end", "side_street", "dumpster", "hidden_entrance",
+    "underground", "secret_room", "abandoned_lot", "burned_out_car",
+    "construction_site", "alley_graffiti_wall", "overgrown_garden",
+    "flooded_chamber", "alley_fight_club", "mysterious_door", "ancient_vault",
+    "speakeasy", "rooftop_access", "rooftop_garden", "abandoned_roof_deck",
+    "rooftop_hideout", "penthouse_ruins", "makeshift_bridge", "rooftop_observatory",
+    "neighboring_roof", "emergency_stairwell", "service_elevator", "maintenance_tunnel",
+    "basement_storage", "utility_room", "sewer_access", "forgotten_archive",
+    "boiler_room", "sewer_main_line", "coal_storage", "sewer_junction",
+    "underground_stream", "storm_drain", "maintenance_shaft", "crystal_cave",
+    "drainage_basin", "street_level_access", "gang_hideout", "forgotten_laboratory",
+    "buried_vault", "sewage_treatment_chamber", "abandoned_warehouse",
+    "loading_dock", "warehouse_office", "industrial_yard", "catwalk",
+    "junkyard_office", "roof_access", "scale_house", "water_tower",
+    "weigh_station", "maintenance_ladder", "ground_level", "perimeter_fence",
+    "chain_lair", "tech_sanctum"
+)
+
 def simulate_bots(player_loc=None, player_name=None):
     global BOT_CHALLENGE
     bots = load_json(BOTS_FILE, [])
     prices_info = get_current_prices()
     prices = prices_info['prices']
-    drug_config_data = load_json('drug_config.json', {"drugs": {}, "drug_effects": {}})
+    drug_config_data = load_config('drug_config.json', {"drugs": {}, "drug_effects": {}})
     drug_list = list(drug_config_data.get('drugs', {}).keys())
     drug_effects = drug_config_data.get('drug_effects', {})
     
-    # Load all available rooms from rooms_config
-    rooms_config_data = load_json(ROOMS_FILE, {"rooms": {}})
-    all_rooms = list(rooms_config_data.get('rooms', {}).keys())
-    
-    # Define allowed rooms for bots (wandering streets and dark alleyway areas)
-    allowed_bot_rooms = [
-        "entrance", "dead_end", "side_street", "dumpster", "hidden_entrance",
-        "underground", "secret_room", "abandoned_lot", "burned_out_car",
-        "construction_site", "alley_graffiti_wall", "overgrown_garden",
-        "flooded_chamber", "alley_fight_club", "mysterious_door", "ancient_vault",
-        "speakeasy", "rooftop_access", "rooftop_garden", "abandoned_roof_deck",
-        "rooftop_hideout", "penthouse_ruins", "makeshift_bridge", "rooftop_observatory",
-        "neighboring_roof", "emergency_stairwell", "service_elevator", "maintenance_tunnel",
-        "basement_storage", "utility_room", "sewer_access", "forgotten_archive",
-        "boiler_room", "sewer_main_line", "coal_storage", "sewer_junction",
-        "underground_stream", "storm_drain", "maintenance_shaft", "crystal_cave",
-        "drainage_basin", "street_level_access", "gang_hideout", "forgotten_laboratory",
-        "buried_vault", "sewage_treatment_chamber", "abandoned_warehouse",
-        "loading_dock", "warehouse_office", "industrial_yard", "catwalk",
-        "junkyard_office", "roof_access", "scale_house", "water_tower",
-        "weigh_station", "maintenance_ladder", "ground_level", "perimeter_fence",
-        "chain_lair", "tech_sanctum"
-    ]
-    
     # Bot drug limits to prevent unlimited accumulation
     MAX_DRUGS_PER_TYPE = 15  # Maximum of 15 units of any single drug
     MAX_TOTAL_DRUGS = 30     # Maximum total drugs across all types
@@ -318,10 +668,9 @@ def simulate_bots(player_loc=None, player_name=None):
         # Bot movement - can explore everywhere but stays in wandering/street areas
         if roll < 0.20:
             # Move to a random allowed room
-            if allowed_bot_rooms:
-                new_room = random.choice(allowed_bot_rooms)
-                b['location'] = new_room
-                b['current_room'] = new_room
+            new_room = random.choice(BOT_ROOMS)
+            b['location'] = new_room
+            b['current_room'] = new_room
         
         # Bot drug usage - bots occasionally take drugs
         elif roll < 0.35 and drug_list and drug_effects:
@@ -343,10 +692,9 @@ def simulate_bots(player_loc=None, player_name=None):
                     drop_drugs_on_death(b, player_loc)
                     # Respawn bot after a short delay (reset health and move to random room)
                     b['health'] = 100
-                    if allowed_bot_rooms:
-                        new_room = random.choice(allowed_bot_rooms)
-                        b['location'] = new_room
-                        b['current_room'] = new_room
+                    new_room = random.choice(BOT_ROOMS)
+                    b['location'] = new_room
+                    b['current_room'] = new_room
                 else:
                     # Announce if player is in same room
                     if b.get('current_room') == player_loc:
@@ -426,6 +774,10 @@ def simulate_bots(player_loc=None, player_name=None):
 
 def load_bots(): return load_json(BOTS_FILE, [])
 
+def get_bot_rooms():
+    """Maps each bot's name to the room it is currently in."""
+    return {b['name']: b.get('current_room') for b in load_bots()}
+
 def get_who_list():
     gs = get_game_state()
     online = [{"name": gs.player_name, "type": "Player", "loc": gs.current_location}]
@@ -436,27 +788,49 @@ def get_who_list():
 
 def get_top_list():
     bots = load_bots()
-    all_p = [{"name": b['name'], "score": (b.get('money', 0) // 1000) + (b.get('members', 1) * 50)} for b in bots]
+    all_p = [{"name": b['name'], "score": calculate_score(b.get('money', 0), 0, b.get('members', 1))} for b in bots]
     gs = get_game_state()
     all_p.append({"name": gs.player_name, "score": gs.current_score})
-    all_p.sort(key=lambda x: x['score'], reverse=True)
-    return all_p[:10]
+    return heapq.nlargest(10, all_p, key=lambda x: x['score'])
 
 # ============
 # Combat Engine
 # ============
 
+@dataclass(frozen=True, slots=True)
+class WeaponSpec:
+    ammo: Optional[str]  # Weapons field that must hold max(ammo_cost, 1) to attack, or None
+    ammo_cost: int  # taken from that field per attack
+    damage: Optional[tuple] = None  # (min, max) damage per attack in combat; None if unusable there
+    cop_kills: Optional[tuple] = None  # (min, max) cops taken out per attack; None if unusable there
+
+    def use(self, weapons) -> bool:
+        """Spends one attack's ammo if the player can make it; returns whether they could."""
+        if self.ammo is None:
+            return True
+        held = getattr(weapons, self.ammo)
+        if held < max(self.ammo_cost, 1):
+            return False
+        setattr(weapons, self.ammo, held - self.ammo_cost)
+        return True
+
+# Shared by process_combat_action (damage) and fight_cops (cop_kills)
+WEAPON_SPECS = {
+    'pistol': WeaponSpec('bullets', 1, damage=(35, 60), cop_kills=(1, 2)),
+    'ar15': WeaponSpec('bullets', 3, damage=(70, 120)),
+    'golden_gun': WeaponSpec(None, 0, damage=(300, 750)),
+    'grenade': WeaponSpec('grenades', 1, cop_kills=(2, 4)),
+    'knife': WeaponSpec('knife', 0, cop_kills=(1, 1)),
+}
+
 def process_combat_action(gs, action, weapon, enemy_hp, enemy_type, enemy_count, is_boss=False):
     log, defeated, dead = [], False, False
     if action == 'attack':
         dmg = random.randint(10, 20)
         # Weapon scaling
-        if weapon == 'pistol' and gs.weapons.bullets > 0:
-            gs.weapons.bullets -= 1; dmg = random.randint(35, 60)
-        elif weapon == 'ar15' and gs.weapons.bullets >= 3:
-            gs.weapons.bullets -= 3; dmg = random.randint(70, 120)
-        elif weapon == 'golden_gun':
-            dmg = random.randint(300, 750)
+        spec = WEAPON_SPECS.get(weapon)
+        if spec and spec.damage and spec.use(gs.weapons):
+            dmg = random.randint(*spec.damage)
         
         if gs.members > 1:
             g_dmg = random.randint(10, 25) * (gs.members - 1)
@@ -487,13 +861,12 @@ def process_combat_action(gs, action, weapon, enemy_hp, enemy_type, enemy_count,
         defeated = True
         log.append(f"VICTORY! Defeated {enemy_type}. Looted cash!")
     
-    if gs.damage >= 30:
-        gs.lives -= 1; gs.damage = 0; gs.health = 30
+    if apply_knockout(gs):
         log.append("YOU WERE KNOCKED OUT! Lost a life.")
         dead = (gs.lives <= 0)
         if dead: add_high_score(gs)
         
-    save_game_state(gs)
+    mark_dirty(gs)
     return defeated, enemy_hp, log, dead
 
 # ============
@@ -513,7 +886,17 @@ weapon_prices_config = {
 }
 
 rooms_config = load_json(ROOMS_FILE, {"rooms": {"entrance": {"title": "Street Entrance", "description": "A dark alleyway leading to the city.", "exits": {"north": "city"}}}})
-npcs_data = load_json(NPCS_FILE, {})
+ALLEYWAY_ROOMS = MappingProxyType(rooms_config['rooms'])  # shared by every alleyway route, never mutated
+EXITS = {(rid, d): tgt for rid, room in ALLEYWAY_ROOMS.items() for d, tgt in room.get('exits', {}).items() if tgt in ALLEYWAY_ROOMS}
+npcs_data = MappingProxyType(load_json(NPCS_FILE, {}))  # parsed once, read-only
+
+# NPC locations never change at runtime, so index them once
+NPCS_BY_LOCATION = {}
+for _npc in npcs_data.values():
+    NPCS_BY_LOCATION.setdefault(_npc.get('location'), []).append(_npc)
+
+def get_location_npcs(loc):
+    return NPCS_BY_LOCATION.get(loc, ())
 
 def generate_random_room(current_rid):
     return "secret_room_" + str(random.randint(1, 100))
@@ -533,43 +916,30 @@ def new_game():
         g_name = request.form.get('gang_name')
         if p_name and g_name:
             gs = GameState(player_name=p_name, gang_name=g_name)
-            save_game_state(gs)
-            session['game_state'] = True
-            return redirect(url_for('city'))
+            save_game_state(gs, force=True)
+            session['game_state'] = True  # index.html shows "Continue Game" off this flag
+            return redirect(endpoint_url('city'))
     return render_template('new_game.html')
 
 @app.route('/city')
 def city():
-    gs = get_game_state()
-    gs.current_location = "city"
-    save_game_state(gs)
+    set_location("city")
     prices_data = get_current_prices()
     return render_template('city.html', city_alert=prices_data.get('fluctuation_alert', ""))
 
-@app.route('/crackhouse')
-def crackhouse():
-    gs = get_game_state(); gs.current_location = "crackhouse"; save_game_state(gs)
-    return render_template('crackhouse.html')
-
-@app.route('/gunshack')
-def gunshack():
-    gs = get_game_state(); gs.current_location = "gunshack"; save_game_state(gs)
-    return render_template('gunshack.html')
+HUB_PAGES = ("crackhouse", "gunshack", "bar", "bank", "picknsave")
 
-@app.route('/bar')
-def bar():
-    gs = get_game_state(); gs.current_location = "bar"; save_game_state(gs)
-    return render_template('bar.html')
+def _hub_view(name):
+    """Builds the view for a city shop: record the visit and render its page."""
+    template = f"{name}.html"
+    def view():
+        set_location(name)
+        return render_template(template)
+    view.__name__ = name
+    return view
 
-@app.route('/bank')
-def bank():
-    gs = get_game_state(); gs.current_location = "bank"; save_game_state(gs)
-    return render_template('bank.html')
-
-@app.route('/picknsave')
-def picknsave():
-    gs = get_game_state(); gs.current_location = "picknsave"; save_game_state(gs)
-    return render_template('picknsave.html')
+for _hub in HUB_PAGES:
+    app.add_url_rule(f"/{_hub}", endpoint=_hub, view_func=_hub_view(_hub))
 
 @app.route('/credits')
 def credits():
@@ -578,8 +948,8 @@ def credits():
 
 @app.route('/high_scores')
 def high_scores():
-    hs = get_high_scores()
-    return render_template('high_scores.html', high_scores=hs)
+    hs, rev = get_high_scores_with_revision()
+    return render_template('high_scores.html', high_scores=hs, high_scores_rev=rev)
 
 @app.route('/wander')
 def wander():
@@ -605,7 +975,7 @@ def wander():
             events.append(f"You bump into {bot['name']} on the streets.")
     elif roll < 0.6:
         # Drug deal opportunity
-        drug_config_data = load_json('drug_config.json', {"drugs": {}})
+        drug_config_data = load_config('drug_config.json', {"drugs": {}})
         drug_list = list(drug_config_data.get('drugs', {}).keys())
         if drug_list:
             drug = random.choice(drug_list)
@@ -613,16 +983,16 @@ def wander():
             price = get_current_prices().get('prices', {}).get(drug, 1000)
             if gs.money >= price * qty:
                 gs.money -= price * qty
-                setattr(gs.drugs, drug, getattr(gs.drugs, drug) + qty)
+                gs.drugs.add(drug, qty)
                 events.append(f"A street dealer offers you {qty} {drug} for ${price * qty}. You take the deal.")
     
-    save_game_state(gs)
+    mark_dirty(gs)
     result = " ".join(events) if events else "You wander around the city without incident."
     return render_template('wander_result.html', result=result)
 
 @app.route('/alleyway')
 def alleyway():
-    gs = get_game_state(); gs.current_location = "alleyway"; save_game_state(gs)
+    gs = set_location("alleyway")
     
     # Initialize session room if not set
     if 'current_room' not in session:
@@ -630,7 +1000,7 @@ def alleyway():
     
     # Get current room from session
     current_room_id = session.get('current_room', 'entrance')
-    current_room = rooms_config['rooms'].get(current_room_id, rooms_config['rooms'].get('entrance'))
+    current_room = ALLEYWAY_ROOMS.get(current_room_id, ALLEYWAY_ROOMS.get('entrance'))
     
     # Simulate bots for this room to ensure they appear
     simulate_bots(current_room_id, gs.player_name)
@@ -647,15 +1017,17 @@ def final_battle():
 
 @app.route('/trade_drugs', methods=['POST'])
 def trade_drugs():
-    gs = get_game_state(); action = request.form.get('action'); d_type = request.form.get('drug_type'); qty = int(request.form.get('quantity', 1))
+    gs = get_game_state(); action = request.form.get('action'); d_type = request.form.get('drug_type'); qty = request.form.get('quantity', type=int)
+    if d_type not in DRUG_TYPES or qty is None or not 1 <= qty <= MAX_TRADE_QUANTITY:
+        flash("Invalid trade."); return redirect(endpoint_url('crackhouse'))
     price = gs.drug_prices.get(d_type, 1000)
     if action == 'buy' and gs.money >= price * qty:
-        gs.money -= price * qty; setattr(gs.drugs, d_type, getattr(gs.drugs, d_type) + qty); modify_market_supply(d_type, -qty)
+        gs.money -= price * qty; gs.drugs.add(d_type, qty); modify_market_supply(d_type, -qty)
         simulate_bots(gs.current_location, gs.player_name)
     elif action == 'sell' and getattr(gs.drugs, d_type) >= qty:
-        gs.money += price * qty; setattr(gs.drugs, d_type, getattr(gs.drugs, d_type) - qty); modify_market_supply(d_type, qty)
+        gs.money += price * qty; gs.drugs.add(d_type, -qty); modify_market_supply(d_type, qty)
         simulate_bots(gs.current_location, gs.player_name)
-    save_game_state(gs); return redirect(url_for('crackhouse'))
+    mark_dirty(gs); return redirect(endpoint_url('crackhouse'))
 
 @app.route('/api/chat/messages')
 def api_get_chat():
@@ -663,19 +1035,22 @@ def api_get_chat():
     # Get room from request parameter or fall back to player's current location
     player_room = request.args.get('room', gs.current_location)
     
+    # Only send what the client has not seen yet
+    new_messages = get_chat_messages(request.args.get('last_id', 0, type=int))
+    if not new_messages:
+        return jsonify({"messages": []})
+    
     # Filter messages to only show those from the same room
     # Messages from bots include their current_room in the message data
     room_messages = []
-    for msg in CHAT_MESSAGES:
+    bot_rooms = get_bot_rooms()
+    for msg in new_messages:
         # Always include player messages and system messages
         if msg['player'] == gs.player_name or msg['player'] == 'SYSTEM':
             room_messages.append(msg)
-        else:
-            # For bot messages, check if bot is in the same room
-            bots = load_bots()
-            bot = next((b for b in bots if b['name'] == msg['player']), None)
-            if bot and bot.get('current_room') == player_room:
-                room_messages.append(msg)
+        # For bot messages, check if bot is in the same room
+        elif bot_rooms.get(msg['player']) == player_room:
+            room_messages.append(msg)
     
     return jsonify({"messages": room_messages})
 
@@ -696,28 +1071,28 @@ def api_send_chat():
             # Handle bot trade: /trade <bot_name> [accept/decline]
             bot_name = ' '.join(cmd_parts[1:])
             bots = load_bots()
-            bot = next((b for b in bots if b['name'].lower() == bot_name.lower()), None)
+            bot = next((b for b in bots if b['name'].lower() == bot_name), None)  # cmd_parts is already lowercased
+            gs = get_game_state()
+            offer = bot.get('trade_offer') if bot else None
             
             if not bot:
                 add_chat_message("SYSTEM", f"Bot '{bot_name}' not found.")
-            elif bot.get('current_room') != get_game_state().current_location:
+            elif bot.get('current_room') != gs.current_location:
                 add_chat_message("SYSTEM", f"{bot_name} is not in your room.")
-            elif 'trade_offer' not in bot:
+            elif not offer:
                 add_chat_message("SYSTEM", f"{bot_name} has no trade offer.")
             else:
                 # Execute the trade
-                offer = bot['trade_offer']
-                gs = get_game_state()
                 drug_type = offer['drug']
                 qty = offer['quantity']
                 price = offer['price']
                 
                 if gs.money >= price * qty:
                     gs.money -= price * qty
-                    setattr(gs.drugs, drug_type, getattr(gs.drugs, drug_type) + qty)
+                    gs.drugs.add(drug_type, qty)
                     bot['money'] = bot.get('money', 0) + price * qty
                     bot['drugs'][drug_type] -= qty
-                    save_game_state(gs)
+                    mark_dirty(gs)
                     add_chat_message("SYSTEM", f"✅ Trade complete! Bought {qty} {drug_type} from {bot_name} for ${price * qty}")
                     del bot['trade_offer']
                 else:
@@ -725,34 +1100,17 @@ def api_send_chat():
         return jsonify({"success": True})
     return jsonify({"success": True, "msg": add_chat_message(player, msg)})
 
+# Rooms where the chat user list is shown (wandering/street/alleyway rooms)
+WANDERING_ROOMS = frozenset(BOT_ROOMS) | {"alleyway"}
+
 @app.route('/api/chat/users')
 def api_get_chat_users():
     """Get list of users (bots and player) in the same room"""
     gs = get_game_state()
     player_room = request.args.get('room', gs.current_location)
     
-    # Only show users in wandering/street/alleyway rooms
-    wandering_rooms = [
-        "entrance", "dead_end", "side_street", "dumpster", "hidden_entrance",
-        "underground", "secret_room", "abandoned_lot", "burned_out_car",
-        "construction_site", "alley_graffiti_wall", "overgrown_garden",
-        "flooded_chamber", "alley_fight_club", "mysterious_door", "ancient_vault",
-        "speakeasy", "rooftop_access", "rooftop_garden", "abandoned_roof_deck",
-        "rooftop_hideout", "penthouse_ruins", "makeshift_bridge", "rooftop_observatory",
-        "neighboring_roof", "emergency_stairwell", "service_elevator", "maintenance_tunnel",
-        "basement_storage", "utility_room", "sewer_access", "forgotten_archive",
-        "boiler_room", "sewer_main_line", "coal_storage", "sewer_junction",
-        "underground_stream", "storm_drain", "maintenance_shaft", "crystal_cave",
-        "drainage_basin", "street_level_access", "gang_hideout", "forgotten_laboratory",
-        "buried_vault", "sewage_treatment_chamber", "abandoned_warehouse",
-        "loading_dock", "warehouse_office", "industrial_yard", "catwalk",
-        "junkyard_office", "roof_access", "scale_house", "water_tower",
-        "weigh_station", "maintenance_ladder", "ground_level", "perimeter_fence",
-        "chain_lair", "tech_sanctum", "alleyway"
-    ]
-    
     # Only return users if we're in a wandering/street room
-    if player_room not in wandering_rooms:
+    if player_room not in WANDERING_ROOMS:
         return jsonify({"users": []})
     
     users = []
@@ -783,7 +1141,9 @@ def bot_trade():
     bot_name = request.form.get('bot_name')
     action = request.form.get('action')  # 'buy' or 'sell'
     drug_type = request.form.get('drug_type')
-    quantity = int(request.form.get('quantity', 1))
+    quantity = request.form.get('quantity', type=int)
+    if drug_type not in DRUG_TYPES or quantity is None or not 1 <= quantity <= MAX_TRADE_QUANTITY:
+        return jsonify({"error": "Invalid trade"}), 400
     
     bots = load_bots()
     bot = next((b for b in bots if b['name'] == bot_name), None)
@@ -803,10 +1163,10 @@ def bot_trade():
         total_cost = price * quantity
         if gs.money >= total_cost and bot.get('drugs', {}).get(drug_type, 0) >= quantity:
             gs.money -= total_cost
-            setattr(gs.drugs, drug_type, getattr(gs.drugs, drug_type) + quantity)
+            gs.drugs.add(drug_type, quantity)
             bot['money'] = bot.get('money', 0) + total_cost
             bot['drugs'][drug_type] -= quantity
-            save_game_state(gs)
+            mark_dirty(gs)
             save_json(BOTS_FILE, bots)
             return jsonify({"success": True, "message": f"Bought {quantity} {drug_type} from {bot_name}"})
         else:
@@ -814,12 +1174,12 @@ def bot_trade():
     
     elif action == 'sell':
         # Player sells to bot
-        if getattr(gs.drugs, drug_type, 0) >= quantity and bot.get('money', 0) >= price * quantity:
+        if getattr(gs.drugs, drug_type) >= quantity and bot.get('money', 0) >= price * quantity:
             gs.money += price * quantity
-            setattr(gs.drugs, drug_type, getattr(gs.drugs, drug_type) - quantity)
+            gs.drugs.add(drug_type, -quantity)
             bot['money'] -= price * quantity
             bot['drugs'][drug_type] = bot.get('drugs', {}).get(drug_type, 0) + quantity
-            save_game_state(gs)
+            mark_dirty(gs)
             save_json(BOTS_FILE, bots)
             return jsonify({"success": True, "message": f"Sold {quantity} {drug_type} to {bot_name}"})
         else:
@@ -833,7 +1193,7 @@ def bot_trade():
 
 @app.route('/prostitutes')
 def visit_prostitutes():
-    gs = get_game_state(); gs.current_location = "prostitutes"; save_game_state(gs)
+    set_location("prostitutes")
     return render_template('prostitutes.html')
 
 @app.route('/prostitute_action', methods=['POST'])
@@ -842,14 +1202,14 @@ def prostitute_action():
     action = request.form.get('action')
     if action == 'quick_service':
         if gs.money >= 200:
-            gs.money -= 200; gs.damage = max(0, gs.damage - 5); save_game_state(gs)
+            gs.money -= 200; gs.damage = max(0, gs.damage - 5); mark_dirty(gs)
     elif action == 'vip_experience':
         if gs.money >= 500:
-            gs.money -= 500; gs.damage = max(0, gs.damage - 10); save_game_state(gs)
+            gs.money -= 500; gs.damage = max(0, gs.damage - 10); mark_dirty(gs)
     elif action == 'recruit_hooker':
         if gs.money >= 1000:
-            gs.money -= 1000; gs.members += 1; save_game_state(gs)
-    return redirect(url_for('prostitutes'))
+            gs.money -= 1000; gs.members += 1; mark_dirty(gs)
+    return redirect(endpoint_url('prostitutes'))
 
 @app.route('/buy_weapon', methods=['POST'])
 def buy_weapon():
@@ -878,18 +1238,18 @@ def buy_weapon():
         elif weapon_type == 'vest_light': gs.weapons.vest += 5
         elif weapon_type == 'vest_medium': gs.weapons.vest += 10
         elif weapon_type == 'vest_heavy': gs.weapons.vest += 15
-        save_game_state(gs)
-    return redirect(url_for('gunshack'))
+        mark_dirty(gs)
+    return redirect(endpoint_url('gunshack'))
 
 @app.route('/upgrade_weapon', methods=['POST'])
 def upgrade_weapon():
     gs = get_game_state()
     weapon_type = request.form.get('weapon_type')
     if weapon_type == 'pistol' and gs.money >= 2000 and gs.weapons.pistols > 0:
-        gs.money -= 2000; gs.weapons.pistol_automatic = True; save_game_state(gs)
+        gs.money -= 2000; gs.weapons.pistol_automatic = True; mark_dirty(gs)
     elif weapon_type == 'ghost_gun' and gs.money >= 2000 and gs.weapons.ghost_guns > 0:
-        gs.money -= 2000; gs.weapons.ghost_gun_automatic = True; save_game_state(gs)
-    return redirect(url_for('gunshack'))
+        gs.money -= 2000; gs.weapons.ghost_gun_automatic = True; mark_dirty(gs)
+    return redirect(endpoint_url('gunshack'))
 
 @app.route('/bank_transaction', methods=['POST'])
 def bank_transaction():
@@ -897,14 +1257,14 @@ def bank_transaction():
     action = request.form.get('action')
     amount = int(request.form.get('amount', 0))
     if action == 'deposit' and gs.money >= amount:
-        gs.money -= amount; gs.account += amount; save_game_state(gs)
+        gs.money -= amount; gs.account += amount; mark_dirty(gs)
     elif action == 'withdraw' and gs.account >= amount:
-        gs.account -= amount; gs.money += amount; save_game_state(gs)
+        gs.account -= amount; gs.money += amount; mark_dirty(gs)
     elif action == 'loan':
-        gs.loan += amount; gs.money += amount; gs.loan_days = 0; save_game_state(gs)
+        gs.loan += amount; gs.money += amount; gs.loan_days = 0; mark_dirty(gs)
     elif action == 'pay_loan' and gs.money >= amount and gs.loan > 0:
-        gs.loan -= amount; gs.money -= amount; save_game_state(gs)
-    return redirect(url_for('bank'))
+        gs.loan -= amount; gs.money -= amount; mark_dirty(gs)
+    return redirect(endpoint_url('bank'))
 
 @app.route('/fight_cops', methods=['POST'])
 def fight_cops():
@@ -914,18 +1274,9 @@ def fight_cops():
     num_cops = int(request.form.get('num_cops', 1))
     
     if action == 'shoot':
-        if weapon == 'pistol' and gs.weapons.bullets > 0:
-            gs.weapons.bullets -= 1
-            dmg = random.randint(35, 60)
-            num_cops -= random.randint(1, 2)
-        elif weapon == 'grenade' and gs.weapons.grenades > 0:
-            gs.weapons.grenades -= 1
-            dmg = 100; num_cops -= random.randint(2, 4)
-        elif weapon == 'knife' and gs.weapons.knife > 0:
-            dmg = random.randint(10, 20)
-            num_cops -= 1
-        else:
-            dmg = 0
+        spec = WEAPON_SPECS.get(weapon)
+        if spec and spec.cop_kills and spec.use(gs.weapons):
+            num_cops -= random.randint(*spec.cop_kills)
         
         if num_cops > 0:
             cop_dmg = random.randint(8, 15) * num_cops
@@ -939,11 +1290,10 @@ def fight_cops():
         else:
             gs.damage += random.randint(15, 30)
     
-    if gs.damage >= 30:
-        gs.lives -= 1; gs.damage = 0; gs.health = 30
+    apply_knockout(gs)
     
-    save_game_state(gs)
-    return redirect(url_for('city'))
+    mark_dirty(gs)
+    return redirect(endpoint_url('city'))
 
 @app.route('/start_war', methods=['POST'])
 def start_war():
@@ -955,11 +1305,9 @@ def start_final_battle():
 
 @app.route('/handle_encounter', methods=['POST'])
 def handle_encounter():
-    gs = get_game_state()
     encounter_type = request.form.get('encounter_type')
     # Simplified encounter handling
-    save_game_state(gs)
-    return redirect(url_for('city'))
+    return redirect(endpoint_url('city'))
 
 @app.route('/move_room', methods=['POST'])
 def move_room():
@@ -968,59 +1316,54 @@ def move_room():
     
     # Get current room from session or default to entrance
     current_room_id = session.get('current_room', 'entrance')
-    current_room = rooms_config['rooms'].get(current_room_id, rooms_config['rooms'].get('entrance'))
+    if current_room_id not in ALLEYWAY_ROOMS:
+        current_room_id = 'entrance'
     
     # Check if the direction is valid
-    if direction in current_room.get('exits', {}):
-        new_room_id = current_room['exits'][direction]
-        new_room = rooms_config['rooms'].get(new_room_id)
-        if new_room:
-            session['current_room'] = new_room_id
-            gs.steps += 1
-            save_game_state(gs)
-            return render_template('alleyway.html', current_room=new_room)
+    new_room_id = EXITS.get((current_room_id, direction))
+    if new_room_id:
+        session['current_room'] = new_room_id
+        gs.steps += 1
+        mark_dirty(gs)
+        return render_template('alleyway.html', current_room=ALLEYWAY_ROOMS[new_room_id])
     
     # Invalid move, go back to current room
-    save_game_state(gs)
-    return redirect(url_for('alleyway'))
+    return redirect(endpoint_url('alleyway'))
 
 @app.route('/search_room')
 def search_room():
-    gs = get_game_state()
-    session['secret_found'] = True
-    save_game_state(gs)
-    return redirect(url_for('alleyway'))
+    if not session.get('secret_found'):
+        session['secret_found'] = True  # only re-sign the cookie when it changes
+    return redirect(endpoint_url('alleyway'))
 
 @app.route('/search_deeper')
 def search_deeper():
     gs = get_game_state()
     gs.money += random.randint(50, 200)
-    save_game_state(gs)
-    return redirect(url_for('alleyway'))
+    mark_dirty(gs)
+    return redirect(endpoint_url('alleyway'))
 
 @app.route('/bulk_purchase', methods=['POST'])
 def bulk_purchase():
-    gs = get_game_state()
     drug_type = request.form.get('drug_type')
     # Simplified bulk purchase
-    save_game_state(gs)
-    return redirect(url_for('closet'))
+    return redirect(endpoint_url('closet'))
 
 @app.route('/picknsave_action', methods=['POST'])
 def picknsave_action():
     gs = get_game_state()
     action = request.form.get('action')
     if action == 'buy_food' and gs.money >= 500:
-        gs.money -= 500; save_game_state(gs)
+        gs.money -= 500; mark_dirty(gs)
     elif action == 'buy_medical' and gs.money >= 1000:
-        gs.money -= 1000; gs.damage = max(0, gs.damage - 10); save_game_state(gs)
+        gs.money -= 1000; gs.damage = max(0, gs.damage - 10); mark_dirty(gs)
     elif action == 'buy_id' and gs.money >= 5000:
-        gs.money -= 5000; gs.flags.has_id = True; save_game_state(gs)
+        gs.money -= 5000; gs.flags['has_id'] = True; mark_dirty(gs)
     elif action == 'buy_info' and gs.money >= 2000:
-        gs.money -= 2000; save_game_state(gs)
+        gs.money -= 2000; mark_dirty(gs)
     elif action == 'recruit' and gs.money >= 10000:
-        gs.money -= 10000; gs.members += 1; save_game_state(gs)
-    return redirect(url_for('picknsave'))
+        gs.money -= 10000; gs.members += 1; mark_dirty(gs)
+    return redirect(endpoint_url('picknsave'))
 
 @app.route('/search_picknsave')
 def search_picknsave():
@@ -1075,7 +1418,7 @@ def npc_trade_action():
 
 @app.route('/continue_activity')
 def continue_activity():
-    return redirect(url_for('wander'))
+    return redirect(endpoint_url('wander'))
 
 @app.route('/closet')
 def closet():
@@ -1085,8 +1428,8 @@ def closet():
 def search_closet():
     gs = get_game_state()
     gs.money += random.randint(10, 100)
-    save_game_state(gs)
-    return redirect(url_for('closet'))
+    mark_dirty(gs)
+    return redirect(endpoint_url('closet'))
 
 @app.route('/npcs')
 def npcs():
@@ -1099,26 +1442,26 @@ def recruit_hooker():
     if gs.money >= 1000:
         gs.money -= 1000
         gs.members += 1
-        save_game_state(gs)
-    return redirect(url_for('alleyway'))
+        mark_dirty(gs)
+    return redirect(endpoint_url('alleyway'))
 
 @app.route('/pickup_loot')
 def pickup_loot():
     npc_id = request.args.get('npc_id', 'nox')
     gs = get_game_state()
     gs.money += random.randint(50, 200)
-    save_game_state(gs)
+    mark_dirty(gs)
     return redirect(url_for('npc_interaction', npc_id=npc_id))
 
 @app.route('/attempt_flee_npc')
 def attempt_flee_npc():
     npc_id = request.args.get('npc_id', 'nox')
     if random.random() < 0.5:
-        return redirect(url_for('city'))
+        return redirect(endpoint_url('city'))
     else:
         gs = get_game_state()
         gs.damage += random.randint(10, 20)
-        save_game_state(gs)
+        mark_dirty(gs)
         return redirect(url_for('npc_interaction', npc_id=npc_id))
 
 if __name__ == '__main__':
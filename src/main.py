@@ -2,24 +2,52 @@ import asyncio
 import websockets
 import json
 
+try:
+    import uvloop
+except ImportError:
+    uvloop = None  # fall back to the default asyncio loop
+
 # Placeholder for user connections
 connections = set()
 
+def broadcast_message(message):
+    """Encodes a chat message once and queues the same frame on every open connection."""
+    websockets.broadcast(connections, json.dumps({"type": "chat", "message": message}))
+
+# Messages arriving within CHAT_BATCH_WINDOW seconds are sent together in one flush,
+# still as ordinary chat frames so clients need no new message type
+CHAT_BATCH_WINDOW = 0.05
+_chat_buffer = []
+_flush_task = None
+
+def queue_message(message):
+    """Buffers a chat message and schedules a flush if one is not already pending."""
+    global _flush_task
+    _chat_buffer.append(message)
+    if _flush_task is None:
+        _flush_task = asyncio.get_running_loop().create_task(flush_messages())
+
+async def flush_messages():
+    global _flush_task
+    await asyncio.sleep(CHAT_BATCH_WINDOW)
+    batch = _chat_buffer[:]
+    _chat_buffer.clear()
+    _flush_task = None
+    for message in batch:
+        broadcast_message(message)
+
 async def handle_connection(websocket, path):
     try:
         connections.add(websocket)
         print(f"Client connected: {websocket.remote_address}")
 
-        async def send_message(ws, message):
-            await ws.send(json.dumps({"type": "chat", "message": message}))
-
         async def receive_message(ws):
             try:
                 message = await ws.recv()
                 print(f"Received from {websocket.remote_address}: {message}")
-                # Broadcast the message to all connected clients
-                for connection in connections:
-                    await send_message(connection, message)
+                # Broadcast the message to all connected clients, skipping blank ones
+                if message and not message.isspace():
+                    queue_message(message)
             except Exception as e:
                 print(f"Error receiving from {websocket.remote_address}: {e}")
                 # Clean up the connection
@@ -44,6 +72,9 @@ async def start_server():
 # Start the server
 async def main():
     await start_server()
+    await asyncio.Future()  # serve until the process is stopped
 
 if __name__ == "__main__":
+    if uvloop:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
     asyncio.run(main())
\ No newline at end of file
@@ -7,6 +7,7 @@ var chatPollInterval = null;
 var lastMessageId = 0;
 var isChatInitialized = false;
 var pollIntervalMs = 3000; // Poll every 3 seconds
+var pollCount = 0;
 
 // Initialize chat when DOM is ready
 document.addEventListener('DOMContentLoaded', function() {
@@ -97,9 +98,12 @@ function startPolling() {
     
     // Start polling interval
     chatPollInterval = setInterval(function() {
+        // Background tabs skip polls; the next visible poll catches up
+        if (document.hidden) return;
         fetchMessages();
         // Update users list every 2 polls (every 6 seconds)
-        if (Math.random() < 0.5) {
+        pollCount++;
+        if (pollCount % 2 === 0) {
             updateChatUsersList();
         }
     }, pollIntervalMs);